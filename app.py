@@ -1,15 +1,57 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response
+from flask.json.provider import DefaultJSONProvider
+import orjson
 import pandas as pd
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 from datetime import datetime
 import os
 import io
 import base64
-from matplotlib.backends.backend_agg import FigureCanvasAgg
+import threading
+import functools
+import contextlib
+import uuid
+from collections import Counter, deque
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from matplotlib.backends.backend_svg import FigureCanvasSVG
 import seaborn as sns
 
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; the single-process dev server doesn't need it
+    fcntl = None
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, used by jsonify and the tojson filter"""
+    
+    def dumps(self, obj, **kwargs):
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        if kwargs.get('separators') == (',', ':'):
+            # Compact output is what orjson produces anyway
+            del kwargs['separators']
+        if kwargs:
+            # Options orjson has no equivalent for, e.g. indent for pretty-printed responses
+            return super().dumps(obj, sort_keys=sort_keys, **kwargs)
+        
+        # Dates go through default() so they keep the HTTP-date format Flask gives them.
+        # NaN and infinity come out as null, where the json module writes invalid JSON
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Configure app for production
 app.config['ENV'] = os.environ.get('FLASK_ENV', 'production')
@@ -19,196 +61,634 @@ app.config['DEBUG'] = False if app.config['ENV'] == 'production' else True
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
+# A single figure and SVG canvas reused for the server-rendered usage charts,
+# drawn side by side so they share one render. It is a bare Figure with its
+# own canvas, so pyplot's global figure manager is never involved. Figures
+# aren't thread-safe, so renders are serialized by _CHART_LOCK. The layout
+# is fixed up front so no tight-bbox measuring pass is needed.
+_FIG = Figure(figsize=(20, 8), dpi=90)
+_AXES = _FIG.subplots(1, 2)
+_FIG.subplots_adjust(left=0.06, right=0.98, top=0.93, bottom=0.18, wspace=0.2)
+_CANVAS = FigureCanvasSVG(_FIG)
+_CHART_LOCK = threading.Lock()
+
 # Data file paths - use /tmp for Render's writable directory in production
 if app.config['ENV'] == 'production':
-    DATA_FILE = '/tmp/construction_materials.csv'
-    USAGE_FILE = '/tmp/material_usage.csv'
+    DATA_DIR = '/tmp/construction_materials'
+    LEGACY_DATA_FILE = '/tmp/construction_materials.csv'
+    USAGE_DIR = '/tmp/material_usage'
+    LEGACY_USAGE_FILE = '/tmp/material_usage.csv'
+    LOCK_FILE = '/tmp/construction_data.lock'
 else:
-    DATA_FILE = 'construction_materials.csv'
-    USAGE_FILE = 'material_usage.csv'
+    DATA_DIR = 'construction_materials'
+    LEGACY_DATA_FILE = 'construction_materials.csv'
+    USAGE_DIR = 'material_usage'
+    LEGACY_USAGE_FILE = 'material_usage.csv'
+    LOCK_FILE = 'construction_data.lock'
+
+# Rows shown per page on the materials list
+MATERIALS_PER_PAGE = 50
+
+# Rows formatted per chunk when streaming the CSV export
+EXPORT_CHUNK_ROWS = 1000
+
+# Low-cardinality text columns stored as categoricals
+CATEGORY_COLUMNS = ['Site_Name', 'Material_Type', 'Unit', 'Supplier']
+USAGE_CATEGORY_COLUMNS = ['Site_Name', 'Unit']
+
+# Appends add a part file each; past this many the dataset is compacted into one
+MAX_PARTS = 64
+
+# Materials are a Parquet dataset (one part file per write); every part
+# shares this schema so the directory reads back as a single table
+MATERIALS_SCHEMA = pa.schema([
+    ('Material_ID', pa.string()),
+    ('Date', pa.timestamp('ns')),
+    ('Site_Name', pa.dictionary(pa.int32(), pa.string())),
+    ('Material_Type', pa.dictionary(pa.int32(), pa.string())),
+    ('Material_Name', pa.string()),
+    ('Quantity', pa.float64()),
+    ('Unit', pa.dictionary(pa.int32(), pa.string())),
+    ('Unit_Cost', pa.float64()),
+    ('Total_Cost', pa.float64()),
+    ('Supplier', pa.dictionary(pa.int32(), pa.string())),
+    ('Notes', pa.string()),
+])
+
+# Usage records are stored the same way
+USAGE_SCHEMA = pa.schema([
+    ('Usage_Date', pa.timestamp('ns')),
+    ('Material_ID', pa.string()),
+    ('Site_Name', pa.dictionary(pa.int32(), pa.string())),
+    ('Material_Name', pa.string()),
+    ('Used_Quantity', pa.float64()),
+    ('Unit', pa.dictionary(pa.int32(), pa.string())),
+    ('Usage_Purpose', pa.string()),
+    ('Used_By', pa.string()),
+    ('Notes', pa.string()),
+])
+
+# Column types for the legacy CSV files, so read_csv skips type inference.
+# Text columns stay plain str: the templates rely on `value or 'N/A'`,
+# which the nullable 'string' dtype's pd.NA would break.
+MATERIALS_DTYPES = {
+    'Site_Name': 'category',
+    'Material_Type': 'category',
+    'Material_Name': str,
+    'Quantity': 'float64',
+    'Unit': 'category',
+    'Unit_Cost': 'float64',
+    'Total_Cost': 'float64',
+    'Supplier': 'category',
+    'Notes': str,
+}
+USAGE_DTYPES = {
+    'Material_ID': str,
+    'Site_Name': 'category',
+    'Material_Name': str,
+    'Used_Quantity': 'float64',
+    'Unit': 'category',
+    'Usage_Purpose': str,
+    'Used_By': str,
+    'Notes': str,
+}
+
+# In-memory copies of the datasets as {path: (parts, df)}. Part files are
+# immutable and uniquely named, so the listing identifies the data exactly.
+_CACHE = {}
+_CACHE_LOCK = threading.RLock()
+
+# gunicorn runs several worker processes and _CACHE_LOCK only covers the
+# threads of one, so the datasets are also guarded by a flock on LOCK_FILE:
+# shared while reading, exclusive for every load-modify-write.
+_FILE_LOCK = {"depth": 0, "file": None, "mode": None}
+
+# Home page summary, kept in step with the cached frame so it is O(1) to read
+_STATS = {"total_cost": 0.0, "count": 0, "site_counts": Counter(), "recent": deque(maxlen=5)}
+
+# Analytics aggregates and chart payloads, keyed by the same part listing
+_ANALYTICS_CACHE = {"version": None, "aggregates": None, "chart_data": None}
+
+# Remaining-quantity table, keyed by the (materials, usage) versions it was derived from
+_REMAINING_CACHE = {"versions": None, "df": None}
+
+# Set once the data stores are known to exist
+_INITIALIZED = False
 
 def initialize_data():
-    """Initialize CSV files with headers if they don't exist"""
-    if not os.path.exists(DATA_FILE):
-        df = pd.DataFrame(columns=[
-            'Date', 'Site_Name', 'Material_Type', 'Material_Name', 
-            'Quantity', 'Unit', 'Unit_Cost', 'Total_Cost', 'Supplier', 'Notes'
-        ])
-        df.to_csv(DATA_FILE, index=False)
-    
-    # Initialize usage tracking file
-    usage_file = 'material_usage.csv'
-    if not os.path.exists(usage_file):
-        df_usage = pd.DataFrame(columns=[
-            'Usage_Date', 'Material_ID', 'Site_Name', 'Material_Name', 
-            'Used_Quantity', 'Unit', 'Usage_Purpose', 'Used_By', 'Notes'
-        ])
-        df_usage.to_csv(usage_file, index=False)
+    """Initialize data files with headers if they don't exist"""
+    global _INITIALIZED
+    if _INITIALIZED:
+        return
+    
+    # Workers of a server that doesn't preload the app all get here; under the exclusive
+    # lock only the first one migrates, the others find the datasets already in place
+    with data_lock(exclusive=True):
+        if not os.path.exists(DATA_DIR):
+            if os.path.exists(LEGACY_DATA_FILE):
+                # One-time migration of the old CSV store to Parquet
+                df = pd.read_csv(LEGACY_DATA_FILE, dtype=MATERIALS_DTYPES, parse_dates=['Date'],
+                                 date_format='ISO8601', cache_dates=True)
+            else:
+                df = pd.DataFrame(columns=[
+                    'Material_ID', 'Date', 'Site_Name', 'Material_Type', 'Material_Name', 
+                    'Quantity', 'Unit', 'Unit_Cost', 'Total_Cost', 'Supplier', 'Notes'
+                ])
+            save_data(df)
+        elif not has_string_ids(DATA_DIR):
+            # Datasets written before string IDs existed are converted once
+            save_data(load_data())
+        
+        # Initialize usage tracking dataset
+        if not os.path.exists(USAGE_DIR):
+            if os.path.exists(LEGACY_USAGE_FILE):
+                # One-time migration of the old CSV store to Parquet
+                df_usage = pd.read_csv(LEGACY_USAGE_FILE, dtype=USAGE_DTYPES, parse_dates=['Usage_Date'],
+                                       date_format='ISO8601', cache_dates=True)
+            else:
+                df_usage = pd.DataFrame(columns=[
+                    'Usage_Date', 'Material_ID', 'Site_Name', 'Material_Name', 
+                    'Used_Quantity', 'Unit', 'Usage_Purpose', 'Used_By', 'Notes'
+                ])
+            save_usage_data(df_usage)
+        elif not has_string_ids(USAGE_DIR):
+            save_usage_data(load_usage_data())
+        
+        _INITIALIZED = True
+
+def has_string_ids(directory):
+    """Whether every part of a dataset stores Material_ID as strings"""
+    # The stored Arrow type, since pandas reads an empty string column back as object
+    for name in dataset_parts(directory) or ():
+        schema = pq.read_schema(os.path.join(directory, name))
+        if 'Material_ID' not in schema.names or not pa.types.is_string(schema.field('Material_ID').type):
+            return False
+    return True
 
 def load_usage_data():
-    """Load usage data from CSV file"""
-    try:
-        df = pd.read_csv('material_usage.csv')
-        if not df.empty:
-            df['Usage_Date'] = pd.to_datetime(df['Usage_Date'])
-        return df
-    except:
-        return pd.DataFrame(columns=[
-            'Usage_Date', 'Material_ID', 'Site_Name', 'Material_Name', 
-            'Used_Quantity', 'Unit', 'Usage_Purpose', 'Used_By', 'Notes'
-        ])
+    """Load usage data from the Parquet dataset, reusing the cached copy while it is unchanged"""
+    with data_lock():
+        parts = dataset_parts(USAGE_DIR)
+        if parts is None:
+            return prepare_usage_data(pd.DataFrame(columns=[
+                'Usage_Date', 'Material_ID', 'Site_Name', 'Material_Name', 
+                'Used_Quantity', 'Unit', 'Usage_Purpose', 'Used_By', 'Notes'
+            ]))
+        
+        entry = _CACHE.get(USAGE_DIR)
+        if entry is None or entry[0] != parts:
+            # A listed part that vanished mid-read raises instead of passing for empty data
+            df = read_parts(USAGE_DIR, parts, USAGE_SCHEMA)
+            _CACHE[USAGE_DIR] = (parts, df)
+        
+        return _CACHE[USAGE_DIR][1].copy(deep=False)
 
 def save_usage_data(df):
-    """Save usage dataframe to CSV file"""
-    df.to_csv('material_usage.csv', index=False)
+    """Rewrite the usage dataset and refresh its cache entry"""
+    with data_lock(exclusive=True):
+        df = prepare_usage_data(df)
+        replace_parts(df, USAGE_DIR, USAGE_SCHEMA)
+        _CACHE[USAGE_DIR] = (dataset_parts(USAGE_DIR), df)
+
+def append_usage_data(new_rows):
+    """Append usage records as a new part file instead of rewriting the whole dataset"""
+    with data_lock(exclusive=True):
+        df = load_usage_data()
+        df = prepare_usage_data(append_rows(df, new_rows, USAGE_CATEGORY_COLUMNS))
+        write_rows(df, new_rows, USAGE_DIR, USAGE_SCHEMA)
+        _CACHE[USAGE_DIR] = (dataset_parts(USAGE_DIR), df)
+
+def prepare_usage_data(df):
+    """Give usage records the dtypes a fresh read of the dataset produces"""
+    df = df.infer_objects()
+    if not pd.api.types.is_string_dtype(df['Material_ID']):
+        df['Material_ID'] = df['Material_ID'].astype(str)
+    df['Usage_Date'] = pd.to_datetime(df['Usage_Date'])
+    for column in USAGE_CATEGORY_COLUMNS:
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
 
 def calculate_remaining_materials():
-    """Calculate remaining quantities for all materials"""
-    materials_df = load_data()
-    usage_df = load_usage_data()
-    
-    if materials_df.empty:
-        return pd.DataFrame()
-    
-    # Add material ID to materials (using index)
-    materials_df = materials_df.reset_index()
-    materials_df['Material_ID'] = materials_df.index
-    
-    remaining_materials = []
-    
-    for _, material in materials_df.iterrows():
-        material_id = material['Material_ID']
-        original_quantity = material['Quantity']
+    """Remaining quantities for all materials, derived once per data version"""
+    with data_lock():
+        materials_df = load_data()
+        usage_df = load_usage_data()
+        versions = (data_version(DATA_DIR), data_version(USAGE_DIR))
         
-        # Calculate total used for this material
-        material_usage = usage_df[usage_df['Material_ID'] == material_id]
-        total_used = material_usage['Used_Quantity'].sum() if not material_usage.empty else 0
+        if None in versions:
+            return compute_remaining_materials(materials_df, usage_df)
+        if _REMAINING_CACHE["versions"] != versions:
+            _REMAINING_CACHE["df"] = compute_remaining_materials(materials_df, usage_df)
+            _REMAINING_CACHE["versions"] = versions
+        return _REMAINING_CACHE["df"].copy(deep=False)
+
+def compute_remaining_materials(materials_df, usage_df):
+    """Calculate remaining quantities from the materials and their usage records"""
+    # Total used per material in one grouped pass, then column-wise arithmetic
+    used = usage_df.groupby('Material_ID', sort=False)['Used_Quantity'].sum().astype('float64')
+    out = materials_df.rename(columns={'Quantity': 'Original_Quantity'})
+    # A lookup rather than a join: joining two empty Arrow-backed string keys fails
+    out['Used_Quantity'] = out['Material_ID'].map(used).fillna(0).astype('float64')
+    
+    original_quantity = out['Original_Quantity'].to_numpy(dtype='float64')
+    used_quantity = out['Used_Quantity'].to_numpy(dtype='float64')
+    remaining_quantity = original_quantity - used_quantity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        usage_percentage = np.where(original_quantity > 0, used_quantity / original_quantity * 100, 0.0)
+    
+    out['Remaining_Quantity'] = remaining_quantity
+    out['Usage_Percentage'] = usage_percentage
+    out['Remaining_Percentage'] = 100 - usage_percentage
+    out['Remaining_Value'] = remaining_quantity * out['Unit_Cost'].to_numpy(dtype='float64')
+    out['Status'] = np.where(remaining_quantity <= 0, 'Depleted', 'Available')
+    
+    return out[[
+        'Material_ID', 'Date', 'Site_Name', 'Material_Type', 'Material_Name',
+        'Original_Quantity', 'Used_Quantity', 'Remaining_Quantity', 'Unit',
+        'Usage_Percentage', 'Remaining_Percentage', 'Unit_Cost', 'Remaining_Value',
+        'Supplier', 'Status'
+    ]]
+
+def load_data():
+    """Load data from the Parquet dataset, reusing the cached copy while it is unchanged"""
+    with data_lock():
+        parts = dataset_parts(DATA_DIR)
+        if parts is None:
+            return apply_categories(pd.DataFrame(columns=[
+                'Material_ID', 'Date', 'Site_Name', 'Material_Type', 'Material_Name', 
+                'Quantity', 'Unit', 'Unit_Cost', 'Total_Cost', 'Supplier', 'Notes'
+            ]))
         
-        remaining_quantity = original_quantity - total_used
-        usage_percentage = (total_used / original_quantity * 100) if original_quantity > 0 else 0
-        remaining_percentage = 100 - usage_percentage
+        entry = _CACHE.get(DATA_DIR)
+        if entry is None or entry[0] != parts:
+            # A listed part that vanished mid-read raises instead of passing for empty data
+            df = apply_categories(read_parts(DATA_DIR, parts, MATERIALS_SCHEMA))
+            _CACHE[DATA_DIR] = (parts, df)
+            reset_stats(df)
         
-        remaining_materials.append({
-            'Material_ID': material_id,
-            'Date': material['Date'],
-            'Site_Name': material['Site_Name'],
-            'Material_Type': material['Material_Type'],
-            'Material_Name': material['Material_Name'],
-            'Original_Quantity': original_quantity,
-            'Used_Quantity': total_used,
-            'Remaining_Quantity': remaining_quantity,
-            'Unit': material['Unit'],
-            'Usage_Percentage': usage_percentage,
-            'Remaining_Percentage': remaining_percentage,
-            'Unit_Cost': material['Unit_Cost'],
-            'Remaining_Value': remaining_quantity * material['Unit_Cost'],
-            'Supplier': material['Supplier'],
-            'Status': 'Depleted' if remaining_quantity <= 0 else 'Available'
-        })
-    
-    return pd.DataFrame(remaining_materials)
+        # Shallow copy so callers can add/replace columns without touching the cache
+        return _CACHE[DATA_DIR][1].copy(deep=False)
 
-def load_data():
-    """Load data from CSV file"""
+@contextlib.contextmanager
+def data_lock(exclusive=False):
+    """Hold the cross-process data lock: shared for reads, exclusive for writes"""
+    with _CACHE_LOCK:
+        if _FILE_LOCK["depth"] == 0:
+            lock_file = open(LOCK_FILE, 'a')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            except BaseException:
+                lock_file.close()
+                raise
+            _FILE_LOCK["file"] = lock_file
+            _FILE_LOCK["mode"] = 'exclusive' if exclusive else 'shared'
+        elif exclusive and _FILE_LOCK["mode"] == 'shared':
+            # flock drops a shared lock before taking the exclusive one, so whatever
+            # was read under it could be stale by the time it is written back
+            raise RuntimeError('data_lock(exclusive=True) requested while holding the shared lock')
+        
+        # Nested calls reuse the held lock
+        _FILE_LOCK["depth"] += 1
+        try:
+            yield
+        finally:
+            _FILE_LOCK["depth"] -= 1
+            if _FILE_LOCK["depth"] == 0:
+                # Closing the file releases the flock
+                _FILE_LOCK["file"].close()
+                _FILE_LOCK["file"] = None
+
+def dataset_parts(directory):
+    """Sorted part file names of a dataset, or None if the directory is missing"""
     try:
-        df = pd.read_csv(DATA_FILE)
-        if not df.empty:
-            df['Date'] = pd.to_datetime(df['Date'])
+        return tuple(sorted(name for name in os.listdir(directory) if name.startswith('part-')))
+    except FileNotFoundError:
+        return None
+
+def read_parts(directory, parts, schema):
+    """Read exactly the listed part files of a dataset"""
+    if not parts:
+        return schema.empty_table().to_pandas()
+    return pd.read_parquet([os.path.join(directory, name) for name in parts], engine='pyarrow')
+
+def data_version(path=DATA_DIR):
+    """Part listing the cached frame for path was loaded from"""
+    entry = _CACHE.get(path)
+    return entry[0] if entry is not None else None
+
+def apply_categories(df):
+    """Cast repeated-key text columns to the category dtype"""
+    for column in CATEGORY_COLUMNS:
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+        elif not df[column].cat.categories.is_monotonic_increasing:
+            # Parts read back with categories in file order; sorting relies on them being sorted
+            df[column] = df[column].cat.reorder_categories(df[column].cat.categories.sort_values())
+    return df
+
+def append_rows(df, new_rows, category_columns=CATEGORY_COLUMNS):
+    """Append rows to a dataframe without losing categorical dtypes"""
+    new_rows = new_rows.copy()
+    for column in category_columns:
+        # Concatenating categoricals only stays categorical when the categories match
+        categories = df[column].cat.categories.union(new_rows[column].dropna().unique())
+        df[column] = df[column].cat.set_categories(categories)
+        new_rows[column] = pd.Categorical(new_rows[column], categories=categories)
+    return pd.concat([df, new_rows], ignore_index=True)
+
+def prepare_data(df):
+    """Normalize dtypes to match what a fresh read of the dataset produces"""
+    df = df.infer_objects()
+    if 'Material_ID' not in df.columns:
+        # Row positions become the IDs, so existing usage references stay valid
+        df.insert(0, 'Material_ID', np.arange(len(df)).astype(str))
+    elif not pd.api.types.is_string_dtype(df['Material_ID']):
+        # Integer IDs from older datasets keep their values, as strings
+        df['Material_ID'] = df['Material_ID'].astype(str)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return apply_categories(df)
+
+def write_part(df, directory, schema):
+    """Write rows as a new part file of a Parquet dataset"""
+    os.makedirs(directory, exist_ok=True)
+    # Zero-padded timestamps keep part files (and therefore rows) in insertion order
+    name = f'part-{time.time_ns():020d}-{os.getpid()}.parquet'
+    path = os.path.join(directory, name)
+    # Readers skip dot-prefixed files, so a half-written part is never picked up
+    tmp_path = os.path.join(directory, f'.{name}.tmp')
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False, schema=schema)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def replace_parts(df, directory, schema):
+    """Replace every part file of a Parquet dataset with a single part holding df"""
+    # Callers hold the exclusive data lock, so the listing can't change before the
+    # rewrite, and readers (on the shared lock) never list both generations of parts
+    stale_parts = dataset_parts(directory) or ()
+    write_part(df, directory, schema)
+    for name in stale_parts:
+        os.remove(os.path.join(directory, name))
+    
+    # Temp files left by a writer that died mid-write; none can be in progress under the lock
+    for name in os.listdir(directory):
+        if name.startswith('.part-'):
+            os.remove(os.path.join(directory, name))
+
+def write_rows(df, new_rows, directory, schema):
+    """Persist appended rows; df is the full table including them"""
+    parts = dataset_parts(directory)
+    if parts is not None and len(parts) >= MAX_PARTS and parts == data_version(directory):
+        # Too many small parts slow every read down, so fold them back into one;
+        # only when df was loaded from exactly the parts on disk
+        replace_parts(df, directory, schema)
+    else:
+        write_part(new_rows, directory, schema)
+
+def rewrite_dataset(df):
+    """Replace the dataset with a single part file holding df and refresh the cache"""
+    with data_lock(exclusive=True):
+        df = prepare_data(df)
+        replace_parts(df, DATA_DIR, MATERIALS_SCHEMA)
+        
+        _CACHE[DATA_DIR] = (dataset_parts(DATA_DIR), df)
         return df
-    except:
-        return pd.DataFrame(columns=[
-            'Date', 'Site_Name', 'Material_Type', 'Material_Name', 
-            'Quantity', 'Unit', 'Unit_Cost', 'Total_Cost', 'Supplier', 'Notes'
-        ])
 
 def save_data(df):
-    """Save dataframe to CSV file"""
-    df.to_csv(DATA_FILE, index=False)
-
-def create_chart(chart_type, df):
-    """Create various charts based on the data"""
-    fig, ax = plt.subplots(figsize=(12, 8))
-    
-    if chart_type == 'cost_by_site':
-        site_costs = df.groupby('Site_Name')['Total_Cost'].sum().sort_values(ascending=False)
-        ax.bar(range(len(site_costs)), site_costs.values)
-        ax.set_xticks(range(len(site_costs)))
-        ax.set_xticklabels(site_costs.index, rotation=45, ha='right')
-        ax.set_title('Total Cost by Construction Site')
-        ax.set_ylabel('Total Cost (₹)')
+    """Rewrite the whole dataset and recompute the summary stats"""
+    with data_lock(exclusive=True):
+        reset_stats(rewrite_dataset(df))
+
+def remove_data(material_id):
+    """Delete a material by ID; returns the deleted row, or None if it doesn't exist"""
+    with data_lock(exclusive=True):
+        df = load_data()
+        keep = df['Material_ID'].to_numpy() != material_id
+        if keep.all():
+            return None
         
-    elif chart_type == 'cost_over_time':
-        df_sorted = df.sort_values('Date')
-        df_sorted['Cumulative_Cost'] = df_sorted['Total_Cost'].cumsum()
-        ax.plot(df_sorted['Date'], df_sorted['Cumulative_Cost'], marker='o')
-        ax.set_title('Cumulative Cost Over Time')
-        ax.set_ylabel('Cumulative Cost (₹)')
-        ax.set_xlabel('Date')
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-        ax.xaxis.set_major_locator(mdates.WeekdayLocator())
-        plt.xticks(rotation=45)
+        removed = df[~keep]
+        kept = df[keep].reset_index(drop=True)
+        for column in CATEGORY_COLUMNS:
+            # Categories double as the filter dropdown options, so drop ones no row uses
+            kept[column] = kept[column].cat.remove_unused_categories()
+        df = rewrite_dataset(kept)
+        remove_stats(removed, df)
+        return removed.iloc[0]
+
+def append_data(new_rows):
+    """Append rows as a new part file instead of rewriting the whole dataset"""
+    with data_lock(exclusive=True):
+        df = load_data()
         
-    elif chart_type == 'material_distribution':
-        material_costs = df.groupby('Material_Type')['Total_Cost'].sum()
-        ax.pie(material_costs.values, labels=material_costs.index, autopct='%1.1f%%')
-        ax.set_title('Cost Distribution by Material Type')
+        # Random IDs are never reused, even by workers appending concurrently
+        new_rows = new_rows.copy()
+        new_rows.insert(0, 'Material_ID', [uuid.uuid4().hex for _ in range(len(new_rows))])
         
-    elif chart_type == 'monthly_spending':
-        df['Month'] = df['Date'].dt.to_period('M')
-        monthly_costs = df.groupby('Month')['Total_Cost'].sum()
-        ax.bar(range(len(monthly_costs)), monthly_costs.values)
-        ax.set_xticks(range(len(monthly_costs)))
-        ax.set_xticklabels([str(m) for m in monthly_costs.index], rotation=45)
-        ax.set_title('Monthly Spending')
-        ax.set_ylabel('Total Cost (₹)')
+        df = prepare_data(append_rows(df, new_rows))
+        write_rows(df, new_rows, DATA_DIR, MATERIALS_SCHEMA)
         
-    elif chart_type == 'material_usage_status':
-        remaining_df = calculate_remaining_materials()
-        if not remaining_df.empty:
-            status_counts = remaining_df['Status'].value_counts()
-            colors = ['#28a745' if status == 'Available' else '#dc3545' for status in status_counts.index]
-            ax.pie(status_counts.values, labels=status_counts.index, autopct='%1.1f%%', colors=colors)
-            ax.set_title('Material Status Distribution')
-        else:
-            ax.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax.transAxes)
-            ax.set_title('Material Status Distribution')
-            
-    elif chart_type == 'remaining_value_by_site':
-        remaining_df = calculate_remaining_materials()
-        if not remaining_df.empty:
-            site_values = remaining_df.groupby('Site_Name')['Remaining_Value'].sum().sort_values(ascending=False)
-            ax.bar(range(len(site_values)), site_values.values, color='#20c997')
-            ax.set_xticks(range(len(site_values)))
-            ax.set_xticklabels(site_values.index, rotation=45, ha='right')
-            ax.set_title('Remaining Material Value by Site')
-            ax.set_ylabel('Remaining Value (₹)')
-        else:
-            ax.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax.transAxes)
-            ax.set_title('Remaining Material Value by Site')
-    
-    plt.tight_layout()
-    
-    # Convert plot to base64 string
-    img = io.BytesIO()
-    plt.savefig(img, format='png', bbox_inches='tight', dpi=150)
-    img.seek(0)
-    plot_url = base64.b64encode(img.getvalue()).decode()
-    plt.close()
+        _CACHE[DATA_DIR] = (dataset_parts(DATA_DIR), df)
+        add_stats(df.iloc[len(df) - len(new_rows):])
+
+def reset_stats(df):
+    """Recompute the home page summary from the full dataframe"""
+    _STATS["total_cost"] = float(df['Total_Cost'].sum()) if not df.empty else 0.0
+    _STATS["count"] = len(df)
+    _STATS["site_counts"] = Counter(df['Site_Name'].dropna())
+    _STATS["recent"] = deque(df.tail(5).to_dict('records'), maxlen=5)
+
+def add_stats(rows):
+    """Fold newly appended rows into the home page summary"""
+    _STATS["total_cost"] += float(rows['Total_Cost'].sum())
+    _STATS["count"] += len(rows)
+    _STATS["site_counts"].update(rows['Site_Name'].dropna())
+    _STATS["recent"].extend(rows.to_dict('records'))
+
+def remove_stats(rows, df):
+    """Take deleted rows out of the home page summary"""
+    _STATS["total_cost"] -= float(rows['Total_Cost'].sum())
+    _STATS["count"] -= len(rows)
+    site_counts = _STATS["site_counts"]
+    for site in rows['Site_Name'].dropna():
+        site_counts[site] -= 1
+        if site_counts[site] <= 0:
+            del site_counts[site]
+    
+    # Only refill the recent entries if one of them was deleted
+    removed_ids = set(rows['Material_ID'])
+    if any(entry['Material_ID'] in removed_ids for entry in _STATS["recent"]):
+        _STATS["recent"] = deque(df.tail(5).to_dict('records'), maxlen=5)
+
+def contains_mask(column, needle):
+    """Case-insensitive substring match, evaluated once per category where possible"""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.str.contains(needle, case=False, regex=False, na=False).to_numpy(dtype=bool)
+    
+    # Match the K categories, then look rows up by code; the extra slot is for missing (-1)
+    categories = column.cat.categories.astype(str)
+    hits = np.append(np.asarray(categories.str.contains(needle, case=False, regex=False), dtype=bool), False)
+    return hits[column.cat.codes.to_numpy()]
+
+def choice_mask(column, value):
+    """Match a dropdown choice exactly, falling back to a substring match for other input"""
+    if isinstance(column.dtype, pd.CategoricalDtype) and value in column.cat.categories:
+        # A single integer compare per row against the chosen category's code
+        return column.cat.codes.to_numpy() == column.cat.categories.get_loc(value)
+    return contains_mask(column, value)
+
+def group_sum(keys, values):
+    """Sum values per key with a NumPy bincount instead of a pandas groupby"""
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        codes, uniques = keys.cat.codes.to_numpy(), keys.cat.categories
+    else:
+        codes, uniques = pd.factorize(keys)
+    
+    # Missing keys are coded -1; drop them like groupby does
+    present = codes >= 0
+    codes = codes[present]
+    weights = values.to_numpy(dtype='float64')[present]
+    totals = np.bincount(codes, weights=weights, minlength=len(uniques))
+    counts = np.bincount(codes, minlength=len(uniques))
+    return pd.Series(totals, index=uniques)[counts > 0]
+
+def monthly_sum(dates, values):
+    """Sum values per calendar month using datetime64[M] buckets instead of Periods"""
+    months = dates.to_numpy().astype('datetime64[M]')
+    valid = ~np.isnat(months)
+    buckets, inverse = np.unique(months[valid], return_inverse=True)
+    totals = np.bincount(inverse, weights=values.to_numpy(dtype='float64')[valid], minlength=len(buckets))
+    return pd.Series(totals, index=np.datetime_as_string(buckets, unit='M'))
+
+def compute_aggregates(df):
+    """Compute the aggregates behind the cost charts"""
+    df_sorted = df.sort_values('Date')
+    costs = df['Total_Cost'].to_numpy(dtype='float64')
+    valid_costs = costs[~np.isnan(costs)]
+    # Sorting leaves missing dates at the end, so the date range is read off the ends
+    dates = df_sorted['Date'].dropna()
+    return {
+        # Name order first, so tied sites rank like groupby(...).idxmax() picked them
+        'site_costs': group_sum(df['Site_Name'], df['Total_Cost']).sort_index().sort_values(ascending=False, kind='stable'),
+        'material_costs': group_sum(df['Material_Type'], df['Total_Cost']),
+        'material_counts': df['Material_Type'].value_counts(sort=False),
+        'monthly_costs': monthly_sum(df['Date'], df['Total_Cost']),
+        'cumulative_cost': pd.Series(df_sorted['Total_Cost'].cumsum().values, index=df_sorted['Date']),
+        'total_cost': valid_costs.sum(),
+        'avg_cost': valid_costs.mean() if len(valid_costs) else 0,
+        'date_min': dates.iloc[0] if not dates.empty else None,
+        'date_max': dates.iloc[-1] if not dates.empty else None
+    }
+
+def get_aggregates(df, version):
+    """Return the chart aggregates, computing them once per data version"""
+    with _CACHE_LOCK:
+        if _ANALYTICS_CACHE["aggregates"] is None or _ANALYTICS_CACHE["version"] != version:
+            _ANALYTICS_CACHE["version"] = version
+            _ANALYTICS_CACHE["aggregates"] = compute_aggregates(df)
+            _ANALYTICS_CACHE["chart_data"] = None
+        return _ANALYTICS_CACHE["aggregates"]
+
+def get_chart_data(df, version):
+    """Return the cost chart payloads rendered client-side by Plotly"""
+    with _CACHE_LOCK:
+        aggregates = get_aggregates(df, version)
+        if _ANALYTICS_CACHE["chart_data"] is None:
+            site_costs = aggregates['site_costs']
+            cumulative_cost = aggregates['cumulative_cost']
+            material_costs = aggregates['material_costs']
+            monthly_costs = aggregates['monthly_costs']
+            _ANALYTICS_CACHE["chart_data"] = {
+                'cost_by_site': {
+                    'labels': [str(site) for site in site_costs.index],
+                    'values': site_costs.values.tolist()
+                },
+                'cost_over_time': {
+                    'labels': cumulative_cost.index.strftime('%Y-%m-%d').tolist(),
+                    'values': cumulative_cost.values.tolist()
+                },
+                'material_distribution': {
+                    'labels': [str(material) for material in material_costs.index],
+                    'values': material_costs.values.tolist()
+                },
+                'monthly_spending': {
+                    'labels': [str(month) for month in monthly_costs.index],
+                    'values': monthly_costs.values.tolist()
+                }
+            }
+        return _ANALYTICS_CACHE["chart_data"]
+
+def draw_usage_status(ax, remaining_df):
+    """Pie chart of available vs depleted materials"""
+    ax.set_title('Material Status Distribution')
+    if remaining_df.empty:
+        ax.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax.transAxes)
+        return
+    
+    status_counts = remaining_df['Status'].value_counts()
+    colors = ['#28a745' if status == 'Available' else '#dc3545' for status in status_counts.index]
+    ax.pie(status_counts.values, labels=status_counts.index, autopct='%1.1f%%', colors=colors)
+
+def draw_remaining_value(ax, remaining_df):
+    """Bar chart of the value of unused material per site"""
+    ax.set_title('Remaining Material Value by Site')
+    if remaining_df.empty:
+        ax.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax.transAxes)
+        return
+    
+    site_values = group_sum(remaining_df['Site_Name'], remaining_df['Remaining_Value']).sort_values(ascending=False)
+    ax.bar(range(len(site_values)), site_values.values, color='#20c997')
+    ax.set_xticks(range(len(site_values)))
+    ax.set_xticklabels(site_values.index, rotation=45, ha='right')
+    ax.set_ylabel('Remaining Value (₹)')
+
+def create_dashboard():
+    """Create the usage charts that are still rendered server-side, as one image"""
+    with data_lock():
+        # Both tables feed these charts, so either one changing invalidates them
+        load_data()
+        load_usage_data()
+        materials_version, usage_version = data_version(DATA_DIR), data_version(USAGE_DIR)
+    return render_dashboard(materials_version, usage_version)
+
+@functools.lru_cache(maxsize=8)
+def render_dashboard(materials_version, usage_version):
+    """Render the usage charts; memoized per data version so unchanged data skips matplotlib"""
+    remaining_df = calculate_remaining_materials()
     
-    return plot_url
+    with _CHART_LOCK:
+        for ax in _AXES:
+            ax.clear()
+            # Pie charts hide the frame and force an equal aspect; clear() resets neither
+            ax.set_frame_on(True)
+            ax.set_aspect('auto')
+        
+        draw_usage_status(_AXES[0], remaining_df)
+        draw_remaining_value(_AXES[1], remaining_df)
+        
+        # Convert plot to base64 SVG string
+        img = io.BytesIO()
+        _CANVAS.print_svg(img)
+        return base64.b64encode(img.getvalue()).decode()
 
 @app.route('/')
 def index():
     """Home page"""
-    df = load_data()
-    
-    # Calculate summary statistics
-    total_cost = df['Total_Cost'].sum() if not df.empty else 0
-    total_entries = len(df)
-    unique_sites = df['Site_Name'].nunique() if not df.empty else 0
-    
-    # Get recent entries
-    recent_entries = df.tail(5).to_dict('records') if not df.empty else []
+    with _CACHE_LOCK:
+        # Refreshes the cache (and stats) if another process changed the data
+        load_data()
+        
+        # Summary statistics are maintained incrementally on every write
+        total_cost = _STATS["total_cost"]
+        total_entries = _STATS["count"]
+        unique_sites = len(_STATS["site_counts"])
+        recent_entries = list(_STATS["recent"])
     
     return render_template('index.html', 
                          total_cost=total_cost,
@@ -234,11 +714,8 @@ def add_material():
             'Notes': request.form['notes']
         }
         
-        # Load existing data and append new entry
-        df = load_data()
-        new_row = pd.DataFrame([data])
-        df = pd.concat([df, new_row], ignore_index=True)
-        save_data(df)
+        # Append the new entry without rewriting existing data
+        append_data(pd.DataFrame([data]))
         
         return redirect(url_for('view_materials'))
     
@@ -258,45 +735,58 @@ def view_materials():
     sort_by = request.args.get('sort_by', 'Date')
     sort_order = request.args.get('sort_order', 'desc')
     
-    # Apply filters
-    filtered_df = df.copy()
+    # Apply filters as one combined mask so the dataframe is indexed once
+    mask = np.ones(len(df), dtype=bool)
     
     if site_filter:
-        filtered_df = filtered_df[filtered_df['Site_Name'].str.contains(site_filter, case=False, na=False)]
+        mask &= contains_mask(df['Site_Name'], site_filter)
     
     if material_filter:
-        filtered_df = filtered_df[filtered_df['Material_Type'].str.contains(material_filter, case=False, na=False)]
+        mask &= choice_mask(df['Material_Type'], material_filter)
     
     if date_from:
         date_from_dt = datetime.strptime(date_from, '%Y-%m-%d')
-        filtered_df = filtered_df[filtered_df['Date'] >= date_from_dt]
+        mask &= (df['Date'] >= date_from_dt).to_numpy()
     
     if date_to:
         date_to_dt = datetime.strptime(date_to, '%Y-%m-%d')
-        filtered_df = filtered_df[filtered_df['Date'] <= date_to_dt]
+        mask &= (df['Date'] <= date_to_dt).to_numpy()
+    
+    # Without filters the cached dataframe is used as-is; nothing below mutates it
+    mask_active = bool(site_filter or material_filter or date_from or date_to)
+    filtered_df = df[mask] if mask_active else df
     
     # Apply sorting
     if not filtered_df.empty and sort_by in filtered_df.columns:
         ascending = sort_order == 'asc'
         filtered_df = filtered_df.sort_values(sort_by, ascending=ascending)
     
-    # Get unique values for filter dropdowns
-    sites = df['Site_Name'].unique().tolist() if not df.empty else []
-    material_types = df['Material_Type'].unique().tolist() if not df.empty else []
-    
-    # Convert to records for template
-    materials = filtered_df.to_dict('records')
+    # Dropdown options come straight from the categories, no column scan needed
+    sites = df['Site_Name'].cat.categories.tolist()
+    material_types = df['Material_Type'].cat.categories.tolist()
     
     # Calculate filtered totals
     filtered_total_cost = filtered_df['Total_Cost'].sum() if not filtered_df.empty else 0
     filtered_count = len(filtered_df)
     
+    # Only convert the requested page to records for the template
+    total_pages = max(1, -(-filtered_count // MATERIALS_PER_PAGE))
+    page = min(max(request.args.get('page', 1, type=int), 1), total_pages)
+    start = (page - 1) * MATERIALS_PER_PAGE
+    materials = filtered_df.iloc[start:start + MATERIALS_PER_PAGE].to_dict('records')
+    
     return render_template('view_materials.html',
                          materials=materials,
                          sites=sites,
                          material_types=material_types,
                          filtered_total_cost=filtered_total_cost,
                          filtered_count=filtered_count,
+                         pagination={
+                             'page': page,
+                             'total_pages': total_pages,
+                             'first_item': start + 1 if materials else 0,
+                             'last_item': start + len(materials)
+                         },
                          current_filters={
                              'site': site_filter,
                              'material_type': material_filter,
@@ -309,39 +799,39 @@ def view_materials():
 @app.route('/analytics')
 def analytics():
     """Analytics dashboard with charts"""
-    df = load_data()
+    with _CACHE_LOCK:
+        df = load_data()
+        version = data_version()
     
     if df.empty:
-        return render_template('analytics.html', charts={}, summary={})
+        return render_template('analytics.html', charts={}, chart_data={}, summary={})
     
-    # Generate charts
+    # Generate charts: cost charts are plotted in the browser from aggregated
+    # data (reused until the data changes), usage charts are rendered here
     charts = {}
+    chart_data = {}
     try:
-        charts['cost_by_site'] = create_chart('cost_by_site', df)
-        charts['cost_over_time'] = create_chart('cost_over_time', df)
-        charts['material_distribution'] = create_chart('material_distribution', df)
-        charts['monthly_spending'] = create_chart('monthly_spending', df)
-        # Add usage-related charts
-        charts['material_usage_status'] = create_chart('material_usage_status', df)
-        charts['remaining_value_by_site'] = create_chart('remaining_value_by_site', df)
+        chart_data = get_chart_data(df, version)
+        charts['usage_dashboard'] = create_dashboard()
     except Exception as e:
         print(f"Error creating charts: {e}")
         charts = {}
     
-    # Calculate summary statistics
+    # Calculate summary statistics, reusing the cached aggregates
+    aggregates = get_aggregates(df, version)
     remaining_df = calculate_remaining_materials()
     summary = {
-        'total_cost': df['Total_Cost'].sum(),
-        'avg_cost_per_entry': df['Total_Cost'].mean(),
-        'most_expensive_site': df.groupby('Site_Name')['Total_Cost'].sum().idxmax(),
-        'most_used_material': df['Material_Type'].mode().iloc[0] if not df['Material_Type'].mode().empty else 'N/A',
-        'date_range': f"{df['Date'].min().strftime('%Y-%m-%d')} to {df['Date'].max().strftime('%Y-%m-%d')}",
+        'total_cost': aggregates['total_cost'],
+        'avg_cost_per_entry': aggregates['avg_cost'],
+        'most_expensive_site': aggregates['site_costs'].index[0] if not aggregates['site_costs'].empty else 'N/A',
+        'most_used_material': aggregates['material_counts'].idxmax() if aggregates['material_counts'].any() else 'N/A',
+        'date_range': f"{aggregates['date_min'].strftime('%Y-%m-%d')} to {aggregates['date_max'].strftime('%Y-%m-%d')}" if aggregates['date_min'] is not None else 'N/A',
         'total_remaining_value': remaining_df['Remaining_Value'].sum() if not remaining_df.empty else 0,
         'available_materials': len(remaining_df[remaining_df['Status'] == 'Available']) if not remaining_df.empty else 0,
         'depleted_materials': len(remaining_df[remaining_df['Status'] == 'Depleted']) if not remaining_df.empty else 0
     }
     
-    return render_template('analytics.html', charts=charts, summary=summary)
+    return render_template('analytics.html', charts=charts, chart_data=chart_data, summary=summary)
 
 @app.route('/material_usage')
 def material_usage():
@@ -353,21 +843,24 @@ def material_usage():
     material_filter = request.args.get('material_type', '')
     status_filter = request.args.get('status', '')
     
-    # Apply filters
-    filtered_df = remaining_df.copy()
+    # Apply filters as one combined mask so the dataframe is indexed once
+    mask = np.ones(len(remaining_df), dtype=bool)
     
     if site_filter:
-        filtered_df = filtered_df[filtered_df['Site_Name'].str.contains(site_filter, case=False, na=False)]
+        mask &= contains_mask(remaining_df['Site_Name'], site_filter)
     
     if material_filter:
-        filtered_df = filtered_df[filtered_df['Material_Type'].str.contains(material_filter, case=False, na=False)]
+        mask &= choice_mask(remaining_df['Material_Type'], material_filter)
     
     if status_filter:
-        filtered_df = filtered_df[filtered_df['Status'] == status_filter]
+        mask &= (remaining_df['Status'] == status_filter).to_numpy()
+    
+    mask_active = bool(site_filter or material_filter or status_filter)
+    filtered_df = remaining_df[mask] if mask_active else remaining_df
     
-    # Get unique values for filters
-    sites = remaining_df['Site_Name'].unique().tolist() if not remaining_df.empty else []
-    material_types = remaining_df['Material_Type'].unique().tolist() if not remaining_df.empty else []
+    # Dropdown options come straight from the categories, no column scan needed
+    sites = remaining_df['Site_Name'].cat.categories.tolist()
+    material_types = remaining_df['Material_Type'].cat.categories.tolist()
     
     # Convert to records
     materials = filtered_df.to_dict('records')
@@ -390,16 +883,17 @@ def material_usage():
                              'status': status_filter
                          })
 
-@app.route('/add_usage/<int:material_id>', methods=['GET', 'POST'])
+@app.route('/add_usage/<material_id>', methods=['GET', 'POST'])
 def add_usage(material_id):
     """Add usage record for a specific material"""
     materials_df = load_data()
+    matches = materials_df[materials_df['Material_ID'] == material_id]
     
-    if material_id >= len(materials_df):
+    if matches.empty:
         return redirect(url_for('material_usage'))
     
     # Convert the material series to a dictionary and ensure date is datetime
-    material = materials_df.iloc[material_id].to_dict()
+    material = matches.iloc[0].to_dict()
     if 'Date' in material and pd.notnull(material['Date']):
         material['Date'] = pd.to_datetime(material['Date'])
     
@@ -428,10 +922,7 @@ def add_usage(material_id):
             'Notes': request.form['notes']
         }
         
-        usage_df = load_usage_data()
-        new_usage = pd.DataFrame([usage_data])
-        usage_df = pd.concat([usage_df, new_usage], ignore_index=True)
-        save_usage_data(usage_df)
+        append_usage_data(pd.DataFrame([usage_data]))
         
         return redirect(url_for('material_usage'))
     
@@ -439,62 +930,46 @@ def add_usage(material_id):
     today = datetime.now().strftime('%Y-%m-%d')
     return render_template('add_usage.html', material=material, material_remaining=material_remaining, today=today)
 
-@app.route('/usage_history/<int:material_id>')
+@app.route('/usage_history/<material_id>')
 def usage_history(material_id):
     """View usage history for a specific material"""
     materials_df = load_data()
     usage_df = load_usage_data()
+    matches = materials_df[materials_df['Material_ID'] == material_id]
     
-    if material_id >= len(materials_df):
+    if matches.empty:
         return redirect(url_for('material_usage'))
     
-    material = materials_df.iloc[material_id]
-    material_usage = usage_df[usage_df['Material_ID'] == material_id].sort_values('Usage_Date', ascending=False)
-    
-    # Calculate running totals
-    usage_records = []
-    cumulative_used = 0
+    material = matches.iloc[0]
+    material_usage = usage_df[usage_df['Material_ID'] == material_id].sort_values('Usage_Date', kind='stable')
     
-    for _, usage in material_usage.iterrows():
-        cumulative_used += usage['Used_Quantity']
-        remaining_at_time = material['Quantity'] - cumulative_used
-        
-        usage_records.append({
-            'Usage_Date': usage['Usage_Date'],
-            'Used_Quantity': usage['Used_Quantity'],
-            'Unit': usage['Unit'],
-            'Usage_Purpose': usage['Usage_Purpose'],
-            'Used_By': usage['Used_By'],
-            'Notes': usage['Notes'],
-            'Cumulative_Used': cumulative_used,
-            'Remaining_After': remaining_at_time
-        })
-    
-    # Reverse to show latest first
-    usage_records.reverse()
+    # Running totals in date order, then latest first for display
+    cumulative_used = material_usage['Used_Quantity'].cumsum()
+    material_usage = material_usage[['Usage_Date', 'Used_Quantity', 'Unit', 'Usage_Purpose', 'Used_By', 'Notes']].assign(
+        Cumulative_Used=cumulative_used,
+        Remaining_After=material['Quantity'] - cumulative_used
+    )
+    usage_records = material_usage.iloc[::-1].to_dict('records')
     
     return render_template('usage_history.html', material=material, usage_records=usage_records)
 
-@app.route('/delete_entry/<int:entry_id>', methods=['POST'])
-def delete_entry(entry_id):
+@app.route('/delete_entry/<material_id>', methods=['POST'])
+def delete_entry(material_id):
     """Delete a specific entry"""
     try:
-        # Load both materials and usage data
-        materials_df = load_data()
-        usage_df = load_usage_data()
-        
-        if 0 <= entry_id < len(materials_df):
-            # Delete the material entry
-            deleted_material = materials_df.iloc[entry_id]
-            materials_df = materials_df.drop(materials_df.index[entry_id]).reset_index(drop=True)
-            save_data(materials_df)
-            
-            # Delete associated usage records
-            usage_df = usage_df[usage_df['Material_ID'] != entry_id]
-            # Update material IDs that are greater than the deleted ID
-            usage_df.loc[usage_df['Material_ID'] > entry_id, 'Material_ID'] -= 1
-            save_usage_data(usage_df)
+        # One exclusive lock over both tables, so no other worker sees the
+        # material gone but its usage records still there
+        with data_lock(exclusive=True):
+            # Delete the material entry; IDs of the other entries are unchanged
+            deleted_material = remove_data(material_id)
             
+            if deleted_material is not None:
+                # Delete associated usage records
+                usage_df = load_usage_data()
+                usage_df = usage_df[usage_df['Material_ID'] != material_id]
+                save_usage_data(usage_df)
+        
+        if deleted_material is not None:
             return jsonify({
                 'success': True, 
                 'message': f'Successfully deleted {deleted_material["Material_Name"]} and its usage records'
@@ -509,19 +984,18 @@ def delete_entry(entry_id):
 @app.route('/export')
 def export_data():
     """Export data to CSV"""
-    df = load_data()
-    
-    # Create a BytesIO object
-    output = io.BytesIO()
-    df.to_csv(output, index=False)
-    output.seek(0)
-    
-    return send_file(
-        io.BytesIO(output.getvalue()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'construction_materials_{datetime.now().strftime("%Y%m%d")}.csv'
-    )
+    # Material_ID is an internal random key that means nothing in the spreadsheet
+    df = load_data().drop(columns='Material_ID')
+    
+    # Stream the CSV in row chunks instead of building the whole file in memory
+    def generate():
+        yield df.iloc[:0].to_csv(index=False)
+        for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+            yield df.iloc[start:start + EXPORT_CHUNK_ROWS].to_csv(index=False, header=False)
+    
+    filename = f'construction_materials_{datetime.now().strftime("%Y%m%d")}.csv'
+    return Response(generate(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 initialize_data()
 
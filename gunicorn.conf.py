@@ -0,0 +1,21 @@
+# Gunicorn settings (loaded automatically from the working directory)
+import multiprocessing
+import os
+
+# Several worker processes so CPU-bound pages like /analytics don't block
+# each other. Chart renders are serialized per process (one shared figure),
+# so workers are also what lets several renders run in parallel. Capped by
+# default because every worker holds its own copy of pandas/matplotlib and
+# the data caches. Override with WEB_CONCURRENCY.
+#
+# Workers share the Parquet datasets on disk: app.py serializes every
+# load-modify-write across processes with a flock (data_lock), and each
+# worker revalidates its cache against the dataset's part listing.
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+
+# Threads let each worker overlap I/O-bound requests
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Import the app once in the master so workers share its memory pages
+preload_app = True